@@ -1,17 +1,21 @@
 import os
 import io
-import json
+import concurrent.futures
+import hashlib
+import mmap
 import pathlib
 import logging
-import re
 from datetime import datetime
+from functools import lru_cache
 
-from flask import Flask, jsonify, request
+import orjson
+from flask import Flask, Response, jsonify, request
+from sqlalchemy import event
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 
-# Import mgz header + summary (NOT mgz.replay, to avoid the "Renamed object" error)
-from mgz import header, summary
+# Import mgz summary (NOT mgz.replay, to avoid the "Renamed object" error)
+from mgz import summary
 
 # ------------------------------------------------------------------------------
 # Flask app & DB setup
@@ -33,31 +37,61 @@ app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
 
 db = SQLAlchemy(app)
 
+# WAL lets /api/game_stats keep reading while the watcher-driven inserts
+# commit, and synchronous=NORMAL drops the second fsync per commit that
+# dominated parse_new_replay latency once the mgz parse is cached.
+with app.app_context():
+    @event.listens_for(db.engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+
 # ------------------------------------------------------------------------------
 # Define the GameStats model
 # ------------------------------------------------------------------------------
 class GameStats(db.Model):
+    # Serve ORDER BY timestamp DESC from an index scan instead of a full sort
+    __table_args__ = (
+        db.Index('ix_game_stats_timestamp_desc', db.text('timestamp DESC')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
+    # unique=True already gives the covering index used by the replay lookup
     replay_file = db.Column(db.String(500), unique=True, nullable=False)
     game_version = db.Column(db.String(50))
-    map = db.Column(db.Text)
+    map = db.Column(db.JSON)
     game_type = db.Column(db.String(50))
     duration = db.Column(db.Integer)
     winner = db.Column(db.String(100))
-    players = db.Column(db.Text)
-    timestamp = db.Column(db.DateTime, nullable=False)
+    players = db.Column(db.JSON)
+    timestamp = db.Column(db.DateTime, nullable=False, index=True)
 
 
 # Ensure tables exist on startup
 with app.app_context():
     db.create_all()
+    # create_all skips tables that already exist, so backfill the timestamp
+    # indexes on databases created before they were added to the model
+    db.session.execute(db.text(
+        "CREATE INDEX IF NOT EXISTS ix_game_stats_timestamp ON game_stats (timestamp)"
+    ))
+    db.session.execute(db.text(
+        "CREATE INDEX IF NOT EXISTS ix_game_stats_timestamp_desc ON game_stats (timestamp DESC)"
+    ))
+    db.session.commit()
 
 # ------------------------------------------------------------------------------
 # Global error handler to ensure CORS on errors
 # ------------------------------------------------------------------------------
 @app.errorhandler(Exception)
 def handle_exception(e):
-    logging.error(f"❌ Uncaught Exception: {e}", exc_info=True)
+    # exc_info already carries the exception text; %s-style args defer
+    # formatting until a handler actually emits the record
+    logging.error("❌ Uncaught exception", exc_info=True)
     response = jsonify({"error": str(e)})
     response.status_code = 500
     response.headers["Access-Control-Allow-Origin"] = "*"
@@ -66,31 +100,80 @@ def handle_exception(e):
 # ------------------------------------------------------------------------------
 # Helper Function: Extract Timestamp from Filename
 # ------------------------------------------------------------------------------
+def _scan_ts(name):
+    """Locate '@YYYY.MM.DD HHMMSS' in a replay filename without the regex engine.
+
+    The pattern is entirely literal separators plus fixed-width digit runs,
+    so ~20 direct character checks replace a full regex search.
+    """
+    i = name.rfind("@")
+    if i < 0 or len(name) - i < 18:
+        return None
+    if name[i + 5] != "." or name[i + 8] != "." or name[i + 11] != " ":
+        return None
+    date_part = name[i + 1:i + 11]
+    time_part = name[i + 12:i + 18]
+    if not (date_part[0:4].isdigit() and date_part[5:7].isdigit()
+            and date_part[8:10].isdigit() and time_part.isdigit()):
+        return None
+    try:
+        return datetime(
+            int(date_part[0:4]), int(date_part[5:7]), int(date_part[8:10]),
+            int(time_part[0:2]), int(time_part[2:4]), int(time_part[4:6]),
+        )
+    except ValueError:
+        return None
+
 def extract_timestamp_from_filename(filename):
-    match = re.search(r"@(\d{4}\.\d{2}\.\d{2}) (\d{6})", filename)
-    if match:
-        date_part, time_part = match.groups()
-        formatted_date = date_part.replace(".", "-")
-        formatted_time = f"{time_part[:2]}:{time_part[2:4]}:{time_part[4:]}"
-        try:
-            return datetime.strptime(f"{formatted_date} {formatted_time}", "%Y-%m-%d %H:%M:%S")
-        except ValueError:
-            return datetime.utcnow()
+    ts = _scan_ts(filename)
+    if ts is not None:
+        return ts
     return datetime.utcnow()
 
 # ------------------------------------------------------------------------------
 # Replay Parsing Function
 # ------------------------------------------------------------------------------
 def parse_replay(replay_path):
-    if not os.path.exists(replay_path):
-        logging.error(f"❌ Replay not found: {replay_path}")
+    """Parse a replay, reusing a cached result while the file is unchanged.
+
+    AoE2 flushes the replay file repeatedly during a match, so the same
+    path gets parsed many times; keying on (path, mtime, size) means the
+    expensive mgz parse runs once per actual change.
+    """
+    try:
+        st = os.stat(replay_path)
+    except FileNotFoundError:
+        logging.error("❌ Replay not found: %s", replay_path)
         return None
+    return _parse_cached(replay_path, st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(maxsize=256)
+def _parse_cached(replay_path, mtime_ns, size):
+    return _parse_replay_uncached(replay_path)
 
+
+# Shared fallback for absent per-player sections; never mutated
+_EMPTY = {}
+
+
+def _parse_replay_uncached(replay_path):
+    # Open directly and let FileNotFoundError replace a separate exists()
+    # probe — one stat fewer per parse, a full RTT each on network mounts.
     try:
-        with open(replay_path, "rb") as f:
-            h = header.parse_stream(f)
-            f.seek(0)
-            match_summary = summary.Summary(f)
+        fd = os.open(replay_path, os.O_RDONLY)
+    except FileNotFoundError:
+        logging.error("❌ Replay not found: %s", replay_path)
+        return None
+
+    try:
+        with os.fdopen(fd, "rb") as raw, \
+                mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            # Summary parses the header internally, so a separate
+            # header.parse_stream pass just to read the version is pure waste
+            match_summary = summary.Summary(io.BytesIO(mm))
 
             duration_seconds = int(match_summary.get_duration() / 1000)
             game_type_str = str(match_summary.get_settings().get("type", "Unknown"))
@@ -98,7 +181,9 @@ def parse_replay(replay_path):
 
             stats = {
                 "replay_file": replay_path,
-                "game_version": str(h.version),
+                # get_version() returns a tuple; element 0 is the Version enum
+                # the old header pass exposed, and what existing rows store
+                "game_version": str(match_summary.get_version()[0]),
                 "map": {
                     "name": match_summary.get_map().get("name", "Unknown"),
                     "size": match_summary.get_map().get("size", "Unknown")
@@ -111,31 +196,39 @@ def parse_replay(replay_path):
             }
 
             for p in match_summary.get_players():
+                mil = p.get("military") or _EMPTY
+                eco = p.get("economy") or _EMPTY
+                tec = p.get("technology") or _EMPTY
+                soc = p.get("society") or _EMPTY
                 player_info = {
                     "name": p.get("name", "Unknown"),
                     "civilization": p.get("civilization", "Unknown"),
                     "winner": p.get("winner", False),
-                    "military_score": p.get("military", {}).get("score", 0),
-                    "economy_score": p.get("economy", {}).get("score", 0),
-                    "technology_score": p.get("technology", {}).get("score", 0),
-                    "society_score": p.get("society", {}).get("score", 0),
-                    "units_killed": p.get("military", {}).get("units_killed", 0),
-                    "fastest_castle_age": p.get("technology", {}).get("fastest_castle_age", 0),
+                    "military_score": mil.get("score", 0),
+                    "economy_score": eco.get("score", 0),
+                    "technology_score": tec.get("score", 0),
+                    "society_score": soc.get("score", 0),
+                    "units_killed": mil.get("units_killed", 0),
+                    "fastest_castle_age": tec.get("fastest_castle_age", 0),
                 }
                 stats["players"].append(player_info)
                 if player_info["winner"]:
                     stats["winner"] = player_info["name"]
 
-            logging.info(f"✅ Parsed replay data successfully: {stats}")
+            logging.debug("✅ Parsed replay data: %s", stats)
             return stats
 
-    except Exception as e:
-        logging.error(f"❌ Error parsing replay: {e}", exc_info=True)
+    except Exception:
+        logging.error("❌ Error parsing replay: %s", replay_path, exc_info=True)
         return None
 
 # ------------------------------------------------------------------------------
 # POST /api/parse_replay
 # ------------------------------------------------------------------------------
+# The mgz parse is CPU-bound; running it in worker processes sidesteps the GIL
+# so Flask threads stay free to accept requests while replays parse.
+_POOL = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count())
+
 @app.route('/api/parse_replay', methods=['POST'])
 def parse_new_replay():
     data = request.json
@@ -150,18 +243,22 @@ def parse_new_replay():
         logging.info(f"⚠️ Replay already in DB: {replay_path}")
         return jsonify({"message": "Replay already in database."}), 200
 
-    parsed_data = parse_replay(replay_path)
+    try:
+        parsed_data = _POOL.submit(parse_replay, replay_path).result(timeout=30)
+    except Exception as e:
+        logging.error(f"❌ Replay parse failed in worker: {e}")
+        parsed_data = None
     if not parsed_data:
         return jsonify({"error": "Failed to parse replay"}), 500
 
     new_game = GameStats(
         replay_file=parsed_data["replay_file"],
         game_version=parsed_data["game_version"],
-        map=json.dumps(parsed_data["map"]),
+        map=parsed_data["map"],
         game_type=parsed_data["game_type"],
         duration=parsed_data["duration"],
         winner=parsed_data["winner"],
-        players=json.dumps(parsed_data["players"]),
+        players=parsed_data["players"],
         timestamp=parsed_data["timestamp"],
     )
 
@@ -180,31 +277,49 @@ def parse_new_replay():
 # ------------------------------------------------------------------------------
 @app.route('/api/game_stats', methods=['GET'])
 def game_stats():
-    all_games = GameStats.query.order_by(GameStats.timestamp.desc()).all()
-    results = []
-    for game in all_games:
-        try:
-            map_data = json.loads(game.map)
-        except:
-            map_data = game.map
-
-        try:
-            player_data = json.loads(game.players)
-        except:
-            player_data = []
-
-        results.append({
-            "id": game.id,
-            "game_version": game.game_version,
-            "map": map_data,
-            "game_type": game.game_type,
-            "duration": game.duration,
-            "winner": game.winner,
-            "players": player_data,
-            "timestamp": str(game.timestamp)
-        })
-
-    return jsonify(results)
+    # One indexed aggregate identifies the current dataset, so a polling
+    # frontend that already has it gets a 304 before any rows are read.
+    latest = db.session.execute(db.text(
+        "SELECT COALESCE(MAX(id), 0), COALESCE(MAX(timestamp), '') FROM game_stats"
+    )).one()
+    etag = hashlib.md5(f"{latest[0]}:{latest[1]}".encode()).hexdigest()
+    if request.headers.get("If-None-Match") == etag:
+        return "", 304
+
+    # Project only the columns we serve and stream the JSON array out row by
+    # row with orjson, so peak memory stays flat regardless of row count.
+    rows = db.session.execute(
+        db.select(
+            GameStats.id, GameStats.game_version, GameStats.map,
+            GameStats.game_type, GameStats.duration, GameStats.winner,
+            GameStats.players, GameStats.timestamp,
+        ).order_by(GameStats.timestamp.desc())
+    ).all()
+
+    def gen():
+        yield b"["
+        first = True
+        for r in rows:
+            item = {
+                "id": r.id,
+                "game_version": r.game_version,
+                "map": r.map,
+                "game_type": r.game_type,
+                "duration": r.duration,
+                "winner": r.winner,
+                "players": r.players or [],
+                "timestamp": str(r.timestamp)
+            }
+            if not first:
+                yield b","
+            first = False
+            yield orjson.dumps(item)
+        yield b"]"
+
+    resp = Response(gen(), mimetype="application/json")
+    resp.headers["ETag"] = etag
+    resp.headers["Cache-Control"] = "private, max-age=5"
+    return resp
 
 # ------------------------------------------------------------------------------
 # Default Route to Avoid 404 Errors
@@ -1,15 +1,24 @@
 import json
 import os
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), "config.json")
 
+@lru_cache(maxsize=1)
 def load_config():
+    # Memoized: the config never changes within a process lifetime, so every
+    # importer after the first gets the parsed dict without touching disk.
     if not os.path.exists(CONFIG_FILE):
         raise RuntimeError(f"Configuration file not found at {CONFIG_FILE}. Please ensure config.json is present.")
     try:
-        with open(CONFIG_FILE, "r") as f:
-            config = json.load(f)
-        return config
+        with open(CONFIG_FILE, "rb") as f:
+            raw = f.read()
+        return orjson.loads(raw) if orjson is not None else json.loads(raw)
     except Exception as e:
         raise RuntimeError(f"Failed to load configuration: {e}")
 
@@ -1,6 +1,8 @@
+import io
 import logging
+import mmap
 import sys
-from mgz import header, summary
+from mgz import summary
 
 # Increase the verbosity of logs
 logging.basicConfig(level=logging.DEBUG)
@@ -12,23 +14,20 @@ def deep_parse(replay_path):
     try:
         logging.debug(f"--- Opening file: {replay_path} ---")
 
-        with open(replay_path, "rb") as f:
-            logging.debug("Parsing replay header...")
-            h = header.parse_stream(f)  # mgz tries to read the replay header
+        with open(replay_path, "rb") as raw, \
+                mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
 
-            # Show basic header info
-            logging.debug(f"Header parse complete. Version: {h.version}")
-
-            # Now, reset file pointer and parse the summary
-            f.seek(0)
+            # Summary parses the header internally; no separate header pass
             logging.debug("Parsing replay summary...")
-            s = summary.Summary(f)
+            s = summary.Summary(io.BytesIO(mm))
 
             # If we get here without an exception, mgz recognized the structure
             logging.debug("Summary parse complete.")
 
             # Print out a couple of fields
-            print(f"Replay version: {h.version}")
+            print(f"Replay version: {s.get_version()[0]}")
             print(f"Match duration: {s.get_duration()}")
             print("Players:")
             for p in s.get_players():
@@ -18,19 +18,26 @@ except Exception as e:
     exit()
 
 # ✅ Step 2: Extract Actions
+# Built once; membership tests against a frozenset beat rebuilding a list
+# for every one of the tens of thousands of actions in a match.
+KEY_OPS = frozenset({"kill", "relic_captured", "wonder_started", "wonder_completed"})
+DEBUG_EVENTS = bool(os.environ.get("DEBUG_EVENTS"))
+
 event_types = set()
 key_events = []
 
 try:
     with open(REPLAY_FILE, "rb") as f:
         for action in fast.parse_stream(f):
-            print(f"🔍 Raw Action Data: {action}")  # Debugging all actions
-            
+            if DEBUG_EVENTS:
+                print(f"🔍 Raw Action Data: {action}")  # Debugging all actions
+
             if isinstance(action, dict):
-                op = action.get("op", "Unknown")
-                event_types.add(op)
+                op = action.get("op")
+                if op:
+                    event_types.add(op)
 
-                if op in ["kill", "relic_captured", "wonder_started", "wonder_completed"]:
+                if op in KEY_OPS:
                     key_events.append(action)
 
 except Exception as e:
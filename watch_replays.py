@@ -1,29 +1,76 @@
 import requests
 import os
+import pathlib
 import platform
+import signal
+import socket
 import time
 import logging
 import json
 import threading
-from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from queue import Empty, SimpleQueue
+from requests.adapters import HTTPAdapter
 from watchdog.observers.polling import PollingObserver
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from config import load_config
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+def _json_loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+class NoDelayAdapter(HTTPAdapter):
+    """HTTPAdapter that disables Nagle's algorithm on its pooled sockets.
+
+    The parse requests are sub-MTU JSON bodies; without TCP_NODELAY some
+    stacks hold them back waiting for an ACK that never piggybacks.
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+        super().init_poolmanager(*args, **kwargs)
+
+# One session process-wide: keep-alive reuses the socket to the local API
+# instead of paying a DNS lookup plus TCP handshake per replay.
+SESSION = requests.Session()
+SESSION.mount("http://", NoDelayAdapter(pool_connections=1, pool_maxsize=4))
+
 # ---------------------------------------------------------------------------------------
 # LOAD CONFIG & SETUP
 # ---------------------------------------------------------------------------------------
 config = load_config()
 config_dirs = config.get("replay_directories", None)
-use_polling = config.get("use_polling", True)
+# Prefer the kernel-notified observer (inotify/FSEvents): zero work when idle
+# and millisecond detection latency. Polling remains an opt-in for mounts
+# that don't emit events.
+use_polling = config.get("use_polling", False)
 polling_interval = config.get("polling_interval", 1)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
-# We track which replays we've already processed to avoid duplicates
+# We track which replays we've already processed to avoid duplicates.
+# New entries go to an append-only log (O(1) bytes per replay); the base JSON
+# snapshot is only rewritten on compaction, not after every single parse.
 PROCESSED_REPLAYS_FILE = "processed_replays.json"
-processed_replays = {}
+PROCESSED_REPLAYS_LOG = PROCESSED_REPLAYS_FILE + ".log"
+# Only membership is ever tested, so a plain set of paths is enough; the old
+# per-path status dicts were dead weight.
+processed_replays = set()
+_log_handle = None
+# Guards processed_replays and the log handle: the HTTP pool callbacks and
+# the worker thread all touch them, and an unguarded truncating rewrite
+# concurrent with a read can shred the JSON and silently discard history.
+_pr_lock = threading.Lock()
 
 # AoE2 HD & DE default directories (macOS example shown; adapt if needed)
 AOE2HD_REPLAY_DIR = (
@@ -36,187 +83,518 @@ AOE2DE_REPLAY_DIR = os.path.expanduser("~/Documents/My Games/Age of Empires 2 DE
 # HELPER FUNCTIONS
 # ---------------------------------------------------------------------------------------
 def load_processed_replays():
-    """Load JSON of previously processed replays into a global dict."""
+    """Load the processed-replays snapshot, then replay the append log."""
     global processed_replays
+    loaded = set()
     try:
-        with open(PROCESSED_REPLAYS_FILE, "r") as f:
-            processed_replays = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        processed_replays = {}
+        with open(PROCESSED_REPLAYS_FILE, "rb") as f:
+            data = _json_loads(f.read())
+        # Older snapshots stored {path: {"status": ...}}; only the keys matter
+        loaded = set(data)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    try:
+        with open(PROCESSED_REPLAYS_LOG, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = _json_loads(line)
+                except ValueError:
+                    continue  # torn write at the tail; drop it
+                if isinstance(entry, dict):  # pre-set log format
+                    loaded.update(entry)
+                else:
+                    loaded.add(entry)
+    except FileNotFoundError:
+        pass
+
+    with _pr_lock:
+        processed_replays = loaded
 
 def save_processed_replays():
-    """Persist the global processed_replays dict to JSON."""
-    with open(PROCESSED_REPLAYS_FILE, "w") as f:
-        json.dump(processed_replays, f, indent=4)
+    """Persist the global processed_replays set to JSON.
+
+    No pretty-printing: nobody hand-edits this file and compact output is
+    both faster to produce and smaller to write.
+    """
+    with _pr_lock:
+        snapshot = list(processed_replays)
+    with open(PROCESSED_REPLAYS_FILE, "wb") as f:
+        f.write(_json_dumps(snapshot))
+
+def log_processed(file_path):
+    """Append one record to the log instead of rewriting the whole set."""
+    global _log_handle
+    with _pr_lock:
+        if _log_handle is None:
+            _log_handle = open(PROCESSED_REPLAYS_LOG, "ab")
+        _log_handle.write(_json_dumps(file_path) + b"\n")
+        _log_handle.flush()
+
+def compact_processed_replays():
+    """Fold the append log into the base snapshot and truncate it."""
+    global _log_handle
+    save_processed_replays()
+    with _pr_lock:
+        if _log_handle is not None:
+            _log_handle.close()
+            _log_handle = None
+        open(PROCESSED_REPLAYS_LOG, "w").close()
 
 def parse_replay(file_path):
     """
-    Call the parse_replay API endpoint to parse & store the replay in the DB.
-    Mark the file as processed on success or error (so we don't retry infinitely).
+    Kick off the parse via the API endpoint without blocking the caller.
+    The POST runs on the HTTP pool; a completion callback marks the file
+    processed on success or error (so we don't retry infinitely).
     """
     if file_path in processed_replays:
-        logging.info(f"⚠️ Replay already processed: {file_path}")
-        return
+        logging.info("⚠️ Replay already processed: %s", file_path)
+        with _inflight_lock:
+            _inflight.discard(file_path)
+        return None
 
-    logging.info(f"✅ Attempting to parse new replay: {file_path}")
+    logging.info("✅ Attempting to parse new replay: %s", file_path)
 
     api_url = "http://localhost:8002/api/parse_replay"
+    # Fail fast if the API is down (2s connect), but still allow a long
+    # read window for large/slow parses.
+    future = HTTP_POOL.submit(
+        SESSION.post, api_url, json={"replay_file": file_path}, timeout=(2, 120)
+    )
+    future.add_done_callback(lambda f: _finish_parse(file_path, f))
+    return future
+
+def _finish_parse(file_path, future):
+    """Completion callback for the API POST: log, mark processed, release."""
     try:
-        # Extended timeout to handle large/slow parse
-        response = requests.post(api_url, json={"replay_file": file_path}, timeout=120)
+        response = future.result()
         if response.status_code == 200:
-            logging.info(f"✅ Successfully parsed and stored replay: {file_path}")
+            logging.info("✅ Successfully parsed and stored replay: %s", file_path)
         else:
-            logging.error(f"❌ API Error ({response.status_code}): {response.json()}")
+            logging.error("❌ API Error (%s): %s", response.status_code, response.json())
     except Exception as e:
-        logging.error(f"❌ Error calling parse endpoint for {file_path}: {e}")
+        logging.error("❌ Error calling parse endpoint for %s: %s", file_path, e)
 
     # Mark as processed to avoid repeated attempts
-    processed_replays[file_path] = {"status": "processed"}
-    save_processed_replays()
-
-def wait_for_stable_file(file_path, stable_seconds=30, verification_seconds=20):
-    """
-    Ensures the file is stable by checking twice before parsing.
-    """
-    last_size = -1
-    stable_time = 0
-    check_interval = 1
-
-    # First Stability Check
-    while stable_time < stable_seconds:
-        if not os.path.exists(file_path):
-            logging.warning(f"⚠️ File disappeared before parsing: {file_path}")
-            return
+    with _pr_lock:
+        processed_replays.add(file_path)
+    log_processed(file_path)
+    with _inflight_lock:
+        _inflight.discard(file_path)
 
-        current_size = os.path.getsize(file_path)
-        if current_size == last_size:
-            stable_time += check_interval
-        else:
-            stable_time = 0
-            last_size = current_size = os.path.getsize(file_path)
-
-        time.sleep(check_interval)
+# ---------------------------------------------------------------------------------------
+# EVENT-DRIVEN FILE STABILITY TRACKING
+# ---------------------------------------------------------------------------------------
+# Instead of blocking the worker for stable_seconds per file (serializing all
+# waits), each FS event just records (size, timestamp) here; a scanner thread
+# promotes files untouched for STABLE_SECONDS to the parse queue. N replays
+# finishing together age concurrently instead of waiting N * stable_seconds.
+STABLE_SECONDS = 30
+# Give up on a file that never goes quiet (e.g. a marathon game still saving)
+# instead of tracking it forever; a later event starts a fresh attempt.
+MAX_PENDING_SECONDS = 30 * 60
+
+pending_stability = {}  # path -> (last_size, last_mtime, last_change_monotonic, first_seen)
+pending_lock = threading.Lock()
+
+def note_activity(file_path):
+    """Record an FS event for a replay file; resets its stability clock."""
+    # One os.stat covers both signals: size alone can plateau mid-write,
+    # but mtime keeps moving while the game is still flushing.
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        with pending_lock:
+            pending_stability.pop(file_path, None)
+        return
 
-    logging.info(f"🕒 Initial stability detected for file: {file_path}. Verifying again...")
+    now = time.monotonic()
+    with pending_lock:
+        last = pending_stability.get(file_path)
+        if last is not None and last[0] == st.st_size and last[1] == st.st_mtime:
+            return  # unchanged: let the entry keep aging
+        first_seen = last[3] if last is not None else now
+        pending_stability[file_path] = (st.st_size, st.st_mtime, now, first_seen)
 
-    # Verification Phase
-    time.sleep(20)  # Wait extra time for certainty
-    new_size = os.path.getsize(file_path)
-    if new_size == last_size:
-        logging.info(f"✅ File confirmed stable, parsing now: {file_path}")
-        parse_replay(file_path)
-    else:
-        logging.warning(f"⚠️ File size changed after verification. Restarting stability check.")
-        wait_for_stable_file(file_path, stable_seconds)
+def stability_scanner():
+    """Promote files that went quiet for STABLE_SECONDS to the parse queue."""
+    while True:
+        time.sleep(1)
+        now = time.monotonic()
+        ready = []
+        with pending_lock:
+            for path, (size, mtime, changed, first_seen) in list(pending_stability.items()):
+                if now - changed >= STABLE_SECONDS:
+                    del pending_stability[path]
+                    if size >= 4096:  # too small to be a real recording
+                        ready.append((path, size, mtime))
+                elif now - first_seen >= MAX_PENDING_SECONDS:
+                    del pending_stability[path]
+                    logging.warning("⚠️ File never stabilized, dropping: %s", path)
+        for path, size, mtime in ready:
+            # Final check with a single stat: catch writes that slipped past
+            # the event stream while the entry aged.
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_size != size or st.st_mtime != mtime:
+                note_activity(path)  # changed silently; start aging again
+                continue
+            logging.info("✅ File confirmed stable, queueing parse: %s", path)
+            enqueue(path)
 
 # ---------------------------------------------------------------------------------------
 # SINGLE-THREADED QUEUE TO LIMIT CONCURRENCY
 # ---------------------------------------------------------------------------------------
-# We use a single background worker thread that processes tasks in FIFO order,
-# ensuring only one parse is done at a time.
-parse_queue = Queue()
+# We use a single background worker thread that drains tasks in FIFO order.
+# SimpleQueue is enough here: one producer (the stability scanner), one
+# consumer, and no join/task accounting. The POSTs themselves run on
+# HTTP_POOL — several replays can be in flight while the queue keeps
+# draining — and completion callbacks handle the bookkeeping.
+parse_queue = SimpleQueue()
+HTTP_POOL = ThreadPoolExecutor(max_workers=4)
+
+# Paths queued or currently parsing; keeps duplicate FS events (polling
+# rescan races can emit on_created twice for the same file) from costing a
+# second stability wait and parse.
+_inflight = set()
+_inflight_lock = threading.Lock()
+
+def enqueue(path):
+    """Queue a path exactly once: skip it if queued, in flight, or processed."""
+    with _inflight_lock:
+        if path in _inflight or path in processed_replays:
+            return
+        _inflight.add(path)
+    parse_queue.put(path)
 
 def parse_worker():
-    """Thread worker that processes stable-file tasks one by one."""
+    """Thread worker that drains queued paths in batches and parses them."""
     while True:
-        file_path = parse_queue.get()
-        if file_path is None:  # Stop signal
+        batch = [parse_queue.get()]
+        # Collect everything else already queued without re-blocking: one
+        # lock trip per extra item, and the batch can be deduplicated before
+        # any filesystem or API work happens.
+        while True:
+            try:
+                batch.append(parse_queue.get_nowait())
+            except Empty:
+                break
+
+        stop = False
+        for file_path in batch:
+            if file_path is None:  # Stop signal
+                stop = True
+            else:  # enqueue() already deduplicated against queued/in-flight
+                parse_replay(file_path)
+
+        if stop:
+            HTTP_POOL.shutdown(wait=True)
             break
-        wait_for_stable_file(file_path, stable_seconds=60)
-        parse_queue.task_done()
 
-# Start the parse worker in the background
+# Load the processed set before any thread that consults it is running
+load_processed_replays()
+
+# Start the parse worker and the stability scanner in the background
 worker_thread = threading.Thread(target=parse_worker, daemon=True)
 worker_thread.start()
+scanner_thread = threading.Thread(target=stability_scanner, daemon=True)
+scanner_thread.start()
 
 # ---------------------------------------------------------------------------------------
 # WATCHDOG EVENT HANDLER
 # ---------------------------------------------------------------------------------------
 import re
 
+_SUFFIX = ".aoe2record"
+
 class ReplayEventHandler(FileSystemEventHandler):
     FINAL_REPLAY_REGEX = re.compile(
     r"MP Replay v.* @\d{4}\.\d{2}\.\d{2} \d{6}(?: \(\d+\))?\.aoe2record$"
     )
 
+    # The timestamp + extension tail is fixed-width; after the endswith
+    # prefilter, matching just the last 40 characters is enough and keeps the
+    # regex engine off the full path on every event.
+    FINAL_TAIL_REGEX = re.compile(
+        r"@\d{4}\.\d{2}\.\d{2} \d{6}(?: \(\d+\))?\.aoe2record$"
+    )
+
+    def __init__(self, known=None):
+        super().__init__()
+        # Replays already on disk at startup; PollingObserver replays them
+        # as synthetic created events, which the catch-up sync already covers.
+        self._known = known if known is not None else frozenset()
 
     def on_created(self, event):
         if event.is_directory:
             return
-        filename = os.path.basename(event.src_path)
-        if self.FINAL_REPLAY_REGEX.match(filename):
-            logging.info(f"🆕 Final Replay Detected: {event.src_path}")
-            parse_queue.put(event.src_path)
+        name = event.src_path
+        if not name.endswith(_SUFFIX):
+            return
+        if name in self._known:
+            return
+        if self.FINAL_TAIL_REGEX.search(name[-40:]):
+            logging.info("🆕 Final Replay Detected: %s", name)
+            note_activity(name)
         else:
-            logging.info(f"⏳ Ignoring temporary file: {event.src_path}")
+            logging.info("⏳ Ignoring temporary file: %s", name)
 
-    # If you really want to parse on each modification, uncomment below:
-    # def on_modified(self, event):
-    #     if event.is_directory:
-    #         return
-    #     if event.src_path.endswith(".aoe2record") or event.src_path.endswith(".aoe2mpgame"):
-    #         logging.info(f"✍️ Replay Modified: {event.src_path}")
-    #         parse_queue.put(event.src_path)
+    def on_modified(self, event):
+        if event.is_directory:
+            return
+        name = event.src_path
+        if not name.endswith(_SUFFIX):
+            return
+        if self.FINAL_TAIL_REGEX.search(name[-40:]):
+            note_activity(name)
 
 # ---------------------------------------------------------------------------------------
 # AUTO-DETECT POTENTIAL DIRECTORIES
 # ---------------------------------------------------------------------------------------
-def get_possible_directories():
-    """Auto-detect likely AoE2 replay directories based on OS."""
-    dirs = []
+DIRS_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "instance", "dirs_cache.json")
+DIRS_CACHE_MAX_AGE = 24 * 3600  # seconds
+
+def _load_cached_directories():
+    """Reuse a recent directory scan if every cached path is still a directory."""
+    try:
+        with open(DIRS_CACHE_FILE, "r") as f:
+            cache = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if time.time() - cache.get("timestamp", 0) > DIRS_CACHE_MAX_AGE:
+        return None
+
+    dirs = cache.get("directories", [])
+    if dirs and all(os.path.isdir(d) for d in dirs):
+        return dirs
+    return None
+
+def _save_cached_directories(dirs):
+    try:
+        os.makedirs(os.path.dirname(DIRS_CACHE_FILE), exist_ok=True)
+        with open(DIRS_CACHE_FILE, "w") as f:
+            json.dump({"timestamp": time.time(), "directories": dirs}, f)
+    except OSError as e:
+        logging.warning(f"⚠️ Could not cache directory scan: {e}")
+
+@lru_cache(maxsize=None)
+def _is_dir_cached(path):
+    """os.path.isdir with the result memoized; one stat per path per process."""
+    return os.path.isdir(path)
+
+def _candidate_directories():
+    """Yield candidate replay directories for the current OS, lazily."""
     system = platform.system()
     home = os.path.expanduser("~")
 
     if system == "Windows":
         userprofile = os.environ.get("USERPROFILE", "")
-        dirs += [
-            os.path.join(userprofile, "Documents", "My Games", "Age of Empires 2 HD", "SaveGame"),
-            os.path.join(userprofile, "Documents", "My Games", "Age of Empires 2 DE", "SaveGame"),
-            r"C:\GOG Games\Age of Empires II HD\SaveGame",
-            r"C:\Age of Empires 2 HD\SaveGame",
-            r"D:\Games\Age of Empires II HD\SaveGame",
-        ]
+        yield os.path.join(userprofile, "Documents", "My Games", "Age of Empires 2 HD", "SaveGame")
+        yield os.path.join(userprofile, "Documents", "My Games", "Age of Empires 2 DE", "SaveGame")
+        yield r"C:\GOG Games\Age of Empires II HD\SaveGame"
+        yield r"C:\Age of Empires 2 HD\SaveGame"
+        yield r"D:\Games\Age of Empires II HD\SaveGame"
     elif system == "Darwin":  # macOS
-        dirs.append(AOE2HD_REPLAY_DIR)
-        dirs.append(AOE2DE_REPLAY_DIR)
+        yield AOE2HD_REPLAY_DIR
+        yield AOE2DE_REPLAY_DIR
     elif system == "Linux":
-        dirs += [
-            os.path.join(home, ".wine", "drive_c", "Program Files (x86)", "Microsoft Games",
-                         "Age of Empires II HD", "SaveGame"),
-            os.path.join(home, ".wine", "drive_c", "Program Files", "Age of Empires II HD", "SaveGame"),
-            os.path.join(home, "Documents", "My Games", "Age of Empires 2 HD", "SaveGame"),
-            os.path.join(home, "Documents", "My Games", "Age of Empires 2 DE", "SaveGame"),
-        ]
+        yield os.path.join(home, ".wine", "drive_c", "Program Files (x86)", "Microsoft Games",
+                           "Age of Empires II HD", "SaveGame")
+        yield os.path.join(home, ".wine", "drive_c", "Program Files", "Age of Empires II HD", "SaveGame")
+        yield os.path.join(home, "Documents", "My Games", "Age of Empires 2 HD", "SaveGame")
+        yield os.path.join(home, "Documents", "My Games", "Age of Empires 2 DE", "SaveGame")
 
-    return [d for d in dirs if os.path.isdir(d)]
+@lru_cache(maxsize=1)
+def get_possible_directories():
+    """Auto-detect likely AoE2 replay directories based on OS.
+
+    Pure function of the OS and home directory, so repeat callers get the
+    memoized list without any syscalls. The candidate probing stats up to a
+    dozen paths, which is user-visible on network-mounted homes, so the
+    resolved list is also cached on disk for a day and revalidated with a
+    single isdir per entry.
+    """
+    cached = _load_cached_directories()
+    if cached is not None:
+        return cached
+
+    found = [d for d in _candidate_directories() if _is_dir_cached(d)]
+    _save_cached_directories(found)
+    return found
+
+# ---------------------------------------------------------------------------------------
+# STARTUP CATCH-UP SYNC
+# ---------------------------------------------------------------------------------------
+def snapshot_existing(directories):
+    """One os.scandir sweep per directory; returns the replay paths present.
+
+    DirEntry carries the type information from the directory read itself, so
+    this costs a single syscall per directory rather than a stat per file.
+    """
+    known = set()
+    for directory in directories:
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_file() and ReplayEventHandler.FINAL_REPLAY_REGEX.match(entry.name):
+                        known.add(entry.path)
+        except OSError:
+            continue
+    return known
+
+def initial_sync(directories, chunk_size=100):
+    """Bulk-ingest replays that accumulated while the watcher was offline.
+
+    Going through the HTTP endpoint would pay one parse plus one WAL flush
+    per replay. Instead, parse the backlog in a process pool and insert in
+    chunks of `chunk_size` rows per transaction — N/chunk_size commits
+    instead of N. Events observed after this sync still use the per-file
+    HTTP path.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from sqlalchemy import insert
+    from app import app as flask_app, db, GameStats
+    from app import parse_replay as parse_replay_local
+
+    candidates = snapshot_existing(directories)
+
+    with flask_app.app_context():
+        known = {row[0] for row in db.session.execute(db.select(GameStats.replay_file))}
+        todo = [p for p in candidates if p not in known and p not in processed_replays]
+        if not todo:
+            return
+
+        logging.info("⏫ Catch-up sync: parsing %d existing replays", len(todo))
+        rows = []
+
+        def flush():
+            if rows:
+                db.session.execute(insert(GameStats), rows)
+                db.session.commit()
+                rows.clear()
+
+        with ProcessPoolExecutor() as pool:
+            for path, stats in zip(todo, pool.map(parse_replay_local, todo)):
+                if not stats:
+                    continue
+                rows.append({
+                    "replay_file": stats["replay_file"],
+                    "game_version": stats["game_version"],
+                    "map": stats["map"],
+                    "game_type": stats["game_type"],
+                    "duration": stats["duration"],
+                    "winner": stats["winner"],
+                    "players": stats["players"],
+                    "timestamp": stats["timestamp"],
+                })
+                if len(rows) >= chunk_size:
+                    flush()
+            flush()
+
+    with _pr_lock:
+        processed_replays.update(todo)
+    save_processed_replays()
 
 # ---------------------------------------------------------------------------------------
 # MAIN WATCH FUNCTION
 # ---------------------------------------------------------------------------------------
-def watch_replay_directories(directories, use_polling=True, interval=1):
+def pick_observer(directories, interval=1):
+    """Choose the observer backend for the given directories.
+
+    Wine writes through translated I/O inside CrossOver bottles, which the
+    native backend doesn't see reliably, so those paths keep polling; every
+    other directory gets kernel-pushed events (inotify/FSEvents).
     """
-    Watches AoE2 HD & DE replay directories for new game files.
-    On creation of an .aoe2record, we queue a parse task to the parse_worker thread.
+    if any("/CrossOver/Bottles/" in d for d in directories):
+        return PollingObserver(timeout=interval)
+    return Observer()
+
+def _schedule_observer(directories, use_polling, known=None, interval=1):
+    """Schedule and start an observer over the given directories.
+
+    Falls back to the PollingObserver if the native backend can't watch a
+    directory (e.g. network mounts that don't emit events).
+
+    The polling backend rescans once per `interval` seconds — its default
+    timeout of 1s would otherwise ignore the configured polling_interval
+    and scan several times more often than asked for.
     """
-    load_processed_replays()
-    observer = PollingObserver() if use_polling else Observer()
+    observer = (PollingObserver(timeout=interval) if use_polling
+                else pick_observer(directories, interval))
+    # One handler for every schedule; it keeps no per-directory state
+    handler = ReplayEventHandler(known)
 
+    existing = []
     for directory in directories:
         if os.path.exists(directory):
-            logging.info(f"👀 Watching directory: {directory}")
-            observer.schedule(ReplayEventHandler(), directory, recursive=False)
+            existing.append(directory)
         else:
             logging.warning(f"⚠️ Directory not found: {directory}")
 
-    observer.start()
+    # When the watched directories share a *near* ancestor (the usual case:
+    # sibling SaveGame folders under one game install), one recursive watch on
+    # the ancestor replaces K separate poll snapshots; the filename filter in
+    # the handler keeps unrelated events out. The depth bound matters: the
+    # auto-detected defaults often share nothing closer than the home
+    # directory (or a drive root on Windows), and recursively watching that
+    # would snapshot the whole tree every poll interval.
+    common = None
+    if len(existing) > 1:
+        try:
+            candidate = os.path.commonpath(existing)
+        except ValueError:
+            candidate = None
+        if candidate and all(
+            len(pathlib.PurePath(d).relative_to(candidate).parts) <= 2
+            for d in existing
+        ):
+            common = candidate
+
     try:
-        while True:
-            time.sleep(interval)
-    except KeyboardInterrupt:
-        logging.info("🛑 Stopping watcher.")
-        observer.stop()
+        if common:
+            logging.info(f"👀 Watching common root: {common}")
+            observer.schedule(handler, common, recursive=True)
+        else:
+            for directory in existing:
+                logging.info(f"👀 Watching directory: {directory}")
+                observer.schedule(handler, directory, recursive=False)
+
+        observer.start()
+    except OSError:
+        if use_polling:
+            raise
+        logging.warning("⚠️ Native observer unavailable, falling back to polling.")
+        return _schedule_observer(directories, use_polling=True, known=known,
+                                  interval=interval)
+
+    return observer
+
+def watch_replay_directories(directories, use_polling=False, interval=1):
+    """
+    Watches AoE2 HD & DE replay directories for new game files.
+    On creation of an .aoe2record, we queue a parse task to the parse_worker thread.
+    """
+    known = snapshot_existing(directories)
+    observer = _schedule_observer(directories, use_polling, known, interval)
+
+    # Park on a kernel wait queue until SIGINT/SIGTERM instead of waking the
+    # interpreter every `interval` seconds just to catch KeyboardInterrupt.
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    stop.wait()
+
+    logging.info("🛑 Stopping watcher.")
+    observer.stop()
     observer.join()
+    compact_processed_replays()
 
 # ---------------------------------------------------------------------------------------
 # ENTRY POINT
@@ -229,6 +607,11 @@ if __name__ == '__main__':
     else:
         possible_dirs = get_possible_directories()
 
+    try:
+        initial_sync(possible_dirs)
+    except Exception as e:
+        logging.warning(f"⚠️ Catch-up sync skipped: {e}")
+
     watch_replay_directories(possible_dirs, use_polling=use_polling, interval=polling_interval)
 
     # If the script is interrupted, gracefully stop the parse queue: